@@ -1,14 +1,16 @@
 # scripts/data_acquisition.py
 
 import asyncio
-import json
 import logging
 import os
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Optional
+import orjson
 from dotenv import load_dotenv
 
+from db import lazy_connection, transaction
+from runtime import run, setup_logging
+
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../config/.env'))
 
 WS_URL = os.getenv("WS_URL", "wss://api.hyperliquid.xyz/ws")
@@ -23,62 +25,96 @@ SUBSCRIPTION_MESSAGE = {
     }
 }
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("../logs/data_acquisition.log", mode='a')
-    ]
-)
+MS_PER_HOUR = 3_600_000
+
+# Finalized hourly candles are queued and written in one transaction every
+# FLUSH_INTERVAL_SECONDS, so the ingest pays one commit per batch, not per row.
+FLUSH_INTERVAL_SECONDS = 1.0
+
+INSERT_HOURLY_CANDLE_SQL = '''
+    INSERT OR IGNORE INTO hourly_candles (timestamp, open, high, low, close, volume)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+setup_logging("../logs/data_acquisition.log")
+
+# Opens one connection on first use and reuses it for every write.
+get_connection = lazy_connection()
 
 def initialize_database(db_path: str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS hourly_candles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT UNIQUE,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    logging.info(f"Initialized SQLite database at {db_path}.")
-
-def insert_hourly_candle(db_path: str, candle: dict):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn = get_connection(db_path)
+    with transaction(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS hourly_candles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT UNIQUE,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL
+            )
+        ''')
+    logging.info("Initialized SQLite database at %s.", db_path)
+
+def hour_end_ms(ts_ms: int) -> int:
+    """
+    Unix milliseconds of the top of the hour following ts_ms.
+    """
+    return (ts_ms // MS_PER_HOUR + 1) * MS_PER_HOUR
+
+def ms_to_iso(ts_ms: int) -> str:
+    """
+    Format unix milliseconds as a naive UTC ISO8601 string, the format
+    hourly_candles.timestamp has always been stored in.
+    """
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+def hourly_candle_row(candle: dict) -> tuple:
+    # The ISO timestamp is only derived here, when the candle is persisted.
+    return (
+        ms_to_iso(candle['end_ts_ms']),
+        candle['open'],
+        candle['high'],
+        candle['low'],
+        candle['close'],
+        candle['volume']
+    )
+
+def insert_hourly_candles(db_path: str, rows: list) -> bool:
+    """
+    Insert a batch of hourly candle rows with a single executemany/commit.
+    Rows whose timestamp already exists are skipped by INSERT OR IGNORE.
+    Returns False if the batch could not be written (nothing was committed).
+    """
+    conn = get_connection(db_path)
     try:
-        cursor.execute('''
-            INSERT INTO hourly_candles (timestamp, open, high, low, close, volume)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            candle['timestamp'],
-            candle['open'],
-            candle['high'],
-            candle['low'],
-            candle['close'],
-            candle['volume']
-        ))
-        conn.commit()
-        logging.info(f"Inserted hourly candle at {candle['timestamp']}.")
-    except sqlite3.IntegrityError:
-        logging.warning(f"Hourly candle at {candle['timestamp']} already exists. Skipping insertion.")
+        with transaction(conn):
+            cursor = conn.executemany(INSERT_HOURLY_CANDLE_SQL, rows)
+        skipped = len(rows) - cursor.rowcount
+        if cursor.rowcount:
+            logging.info("Inserted %s hourly candle(s) ending %s.", cursor.rowcount, rows[-1][0])
+        if skipped:
+            logging.warning("Skipped %s hourly candle(s) that already exist.", skipped)
     except Exception as e:
-        logging.error(f"Failed to insert hourly candle: {e}")
-    finally:
-        conn.close()
+        logging.error("Failed to insert %s hourly candle(s): %s", len(rows), e)
+        return False
+    return True
 
-def initialize_hourly_candle(timestamp: datetime, price: float) -> dict:
-    candle_start_time = timestamp.replace(minute=0, second=0, microsecond=0)
-    candle_end_time = candle_start_time + timedelta(hours=1)
+async def flush_pending_candles(db_path: str, pending: list):
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        # Rows are only dropped once committed; after a failure (e.g. the
+        # database stayed locked past busy_timeout) the next flush retries them.
+        if pending and insert_hourly_candles(db_path, pending):
+            pending.clear()
+
+def initialize_hourly_candle(ts_ms: int, price: float) -> dict:
+    # Times are kept as integer unix milliseconds so the receive loop
+    # compares plain ints rather than datetime objects.
+    end_ts_ms = hour_end_ms(ts_ms)
     return {
-        'timestamp': candle_end_time.isoformat(),
+        'end_ts_ms': end_ts_ms,
         'open': price,
         'high': price,
         'low': price,
@@ -94,71 +130,79 @@ def update_hourly_candle(hourly_candle: dict, minute_candle: dict) -> dict:
     return hourly_candle
 
 async def subscribe_candles(websocket):
-    await websocket.send(json.dumps(SUBSCRIPTION_MESSAGE))
+    # Sent as text: Hyperliquid expects subscription requests in text frames.
+    await websocket.send(orjson.dumps(SUBSCRIPTION_MESSAGE).decode())
     logging.info("Subscribed to BTC 1-minute candles.")
 
 async def receive_and_aggregate_candles():
     initialize_database(SQLITE_DB_PATH)
     current_hourly_candle: Optional[dict] = None
+    pending: list = []
+    flusher = asyncio.create_task(flush_pending_candles(SQLITE_DB_PATH, pending))
 
     import websockets
-    while True:
-        try:
-            async with websockets.connect(WS_URL) as websocket:
-                await subscribe_candles(websocket)
-                logging.info("Waiting for minute candle data...")
-
-                async for message in websocket:
-                    data = json.loads(message)
-                    if data.get("channel") == "subscriptionResponse":
-                        subscription = data.get("data", {})
-                        logging.info(f"Subscription Response: {subscription}")
-
-                    elif data.get("channel") == "candle":
-                        candle = data.get("data")
-                        if not candle:
-                            logging.warning("Received candle data without 'data' field.")
-                            continue
-
-                        try:
-                            minute_close_time = datetime.utcfromtimestamp(candle['T'] / 1000)
-                            open_price = float(candle['o'])
-                            high_price = float(candle['h'])
-                            low_price = float(candle['l'])
-                            close_price = float(candle['c'])
-                            volume = float(candle['v'])
-                        except (KeyError, ValueError, TypeError) as e:
-                            logging.error(f"Invalid candle data format: {e}")
-                            continue
-
-                        minute_candle = {
-                            'timestamp': minute_close_time,
-                            'open': open_price,
-                            'high': high_price,
-                            'low': low_price,
-                            'close': close_price,
-                            'volume': volume
-                        }
-
-                        if current_hourly_candle is None:
-                            current_hourly_candle = initialize_hourly_candle(minute_close_time, open_price)
-                            continue
-
-                        if minute_close_time < datetime.fromisoformat(current_hourly_candle['timestamp']):
-                            current_hourly_candle = update_hourly_candle(current_hourly_candle, minute_candle)
-                        else:
-                            insert_hourly_candle(SQLITE_DB_PATH, current_hourly_candle)
-                            current_hourly_candle = initialize_hourly_candle(minute_close_time, open_price)
-
-        except websockets.ConnectionClosed as e:
-            logging.warning(f"WebSocket connection closed: {e}. Reconnecting in 5 seconds...")
-            await asyncio.sleep(5)
-        except Exception as e:
-            logging.error(f"An error occurred: {e}. Reconnecting in 5 seconds...")
-            await asyncio.sleep(5)
+    try:
+        while True:
+            try:
+                async with websockets.connect(WS_URL) as websocket:
+                    await subscribe_candles(websocket)
+                    logging.info("Waiting for minute candle data...")
+
+                    async for message in websocket:
+                        data = orjson.loads(message)
+                        if data.get("channel") == "subscriptionResponse":
+                            subscription = data.get("data", {})
+                            logging.info("Subscription Response: %s", subscription)
+
+                        elif data.get("channel") == "candle":
+                            candle = data.get("data")
+                            if not candle:
+                                logging.warning("Received candle data without 'data' field.")
+                                continue
+
+                            try:
+                                ts_ms = int(candle['T'])
+                                open_price = float(candle['o'])
+                                high_price = float(candle['h'])
+                                low_price = float(candle['l'])
+                                close_price = float(candle['c'])
+                                volume = float(candle['v'])
+                            except (KeyError, ValueError, TypeError) as e:
+                                logging.error("Invalid candle data format: %s", e)
+                                continue
+
+                            minute_candle = {
+                                'timestamp': ts_ms,
+                                'open': open_price,
+                                'high': high_price,
+                                'low': low_price,
+                                'close': close_price,
+                                'volume': volume
+                            }
+
+                            if current_hourly_candle is None:
+                                current_hourly_candle = initialize_hourly_candle(ts_ms, open_price)
+                                continue
+
+                            if ts_ms < current_hourly_candle['end_ts_ms']:
+                                current_hourly_candle = update_hourly_candle(current_hourly_candle, minute_candle)
+                            else:
+                                pending.append(hourly_candle_row(current_hourly_candle))
+                                current_hourly_candle = initialize_hourly_candle(ts_ms, open_price)
+
+            except websockets.ConnectionClosed as e:
+                logging.warning("WebSocket connection closed: %s. Reconnecting in 5 seconds...", e)
+                await asyncio.sleep(5)
+            except Exception as e:
+                logging.error("An error occurred: %s. Reconnecting in 5 seconds...", e)
+                await asyncio.sleep(5)
+    finally:
+        flusher.cancel()
+        if pending:
+            insert_hourly_candles(SQLITE_DB_PATH, pending[:])
 
 if __name__ == "__main__":
     try:
-        asyncio.run(receive_and_aggregate_candles())
+        run(receive_and_aggregate_candles())
     except KeyboardInterrupt:
         logging.info("Data acquisition stopped manually.")
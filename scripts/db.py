@@ -0,0 +1,61 @@
+# scripts/db.py
+
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    """
+    Open a SQLite connection meant to be held for the lifetime of a process.
+    WAL lets readers and the writer run concurrently, and synchronous=NORMAL
+    only fsyncs on checkpoints instead of on every commit. busy_timeout makes
+    a writer wait up to 5 seconds for another process's lock instead of
+    failing with SQLITE_BUSY.
+
+    The connection is in autocommit mode (isolation_level=None): the sqlite3
+    module never opens or commits transactions implicitly, so writes that
+    must be grouped go through transaction().
+    """
+    kwargs.setdefault("isolation_level", None)
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    return conn
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """
+    Run the enclosed statements in one explicit BEGIN IMMEDIATE ... COMMIT,
+    rolling back if the block raises. IMMEDIATE takes the write lock up front,
+    so a read-then-write block cannot be interleaved with another writer.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def lazy_connection(**kwargs) -> Callable[[str], sqlite3.Connection]:
+    """
+    Return a get_connection(db_path) function for one module: the first call
+    opens a connection with connect(db_path, **kwargs), and every later call
+    returns that same connection. It is closed at interpreter exit.
+    """
+    conn = None
+    lock = threading.Lock()
+
+    def get_connection(db_path: str) -> sqlite3.Connection:
+        nonlocal conn
+        with lock:
+            if conn is None:
+                conn = connect(db_path, **kwargs)
+                atexit.register(conn.close)
+        return conn
+    return get_connection
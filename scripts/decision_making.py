@@ -5,10 +5,14 @@ import json
 import logging
 import os
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Optional
+import numpy as np
 from dotenv import load_dotenv
 
+from db import lazy_connection, transaction
+from runtime import run, setup_logging
+
 # Import the function to execute signals
 from trade_execution_logic import execute_pending_signals
 
@@ -19,14 +23,45 @@ LEVERAGE_BASE = float(os.getenv("LEVERAGE_BASE", 5))
 LEVERAGE_EXPONENT = float(os.getenv("LEVERAGE_EXPONENT", 7))
 SYMBOL = os.getenv("SYMBOL", "BTC")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("../logs/decision_making.log", mode='a')
-    ]
-)
+# Trades are closed once they have been open for at least this long.
+HOLD_DURATION_MS = 3_600_000
+
+# How often the idle loop checks whether another process committed new data.
+DATA_VERSION_POLL_SECONDS = 0.5
+
+# Upper bound on candles fetched per query while catching up on a backlog.
+PENDING_CANDLES_BATCH_SIZE = 256
+
+setup_logging("../logs/decision_making.log")
+
+# Opens one connection on first use and reuses it across loop iterations.
+get_connection = lazy_connection()
+
+def get_data_version(db_path: str) -> int:
+    """
+    Return SQLite's data_version counter for our connection. It changes whenever
+    another connection commits to the database file, and reading it does not
+    touch any table.
+    """
+    return get_connection(db_path).execute("PRAGMA data_version").fetchone()[0]
+
+async def wait_for_new_data(db_path: str, data_version: int) -> int:
+    """
+    Sleep until some other connection (e.g. data_acquisition.py) commits, then
+    return the new data_version.
+    """
+    while True:
+        current = get_data_version(db_path)
+        if current != data_version:
+            return current
+        await asyncio.sleep(DATA_VERSION_POLL_SECONDS)
+
+def iso_to_ms(timestamp_str: str) -> int:
+    """
+    Convert a stored candle timestamp (naive ISO8601, UTC) to unix milliseconds.
+    """
+    dt = datetime.fromisoformat(timestamp_str).replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
 
 def calculate_ibs(close: float, low: float, high: float) -> float:
     if high == low:
@@ -40,6 +75,24 @@ def determine_leverage(ibs: float) -> int:
     leverage = max(1, leverage)
     return int(round(leverage))
 
+def calculate_ibs_batch(close: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """
+    Vectorized calculate_ibs over arrays of candles. Flat candles (high == low)
+    get 0.5, matching the scalar version.
+    """
+    price_range = high - low
+    flat = price_range == 0
+    ibs = (close - low) / np.where(flat, 1.0, price_range)
+    return np.where(flat, 0.5, np.clip(ibs, 0.0, 1.0))
+
+def determine_leverage_batch(ibs: np.ndarray) -> np.ndarray:
+    """
+    Vectorized determine_leverage. np.round rounds half to even, like round().
+    """
+    leverage = LEVERAGE_BASE * (1 - ibs) ** LEVERAGE_EXPONENT
+    leverage = np.clip(leverage, 1, LEVERAGE_BASE)
+    return np.round(leverage).astype(int)
+
 def format_trade_signal(action: str, timestamp: str, symbol: str, side: str, price: float, leverage: Optional[float]=None) -> dict:
     signal = {
         "action": action,
@@ -52,76 +105,85 @@ def format_trade_signal(action: str, timestamp: str, symbol: str, side: str, pri
         signal["leverage"] = leverage
     return signal
 
-def has_active_trade(db_path: str) -> bool:
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*) FROM trade_signals
-        WHERE action = 'open' AND executed = 0
-    ''')
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count > 0
+def get_active_trade(conn: sqlite3.Connection, symbol: str) -> Optional[dict]:
+    """
+    Return symbol's latest open signal that has no later close, if any,
+    whether it is still pending or already executed (a live position).
+    Opens that failed (executed = 2) never opened anything. Used once at
+    startup to recover TradingLogic's state after a restart.
+    """
+    cursor = conn.execute('''
+        SELECT timestamp, price, leverage FROM trade_signals AS o
+        WHERE o.action = 'open' AND o.symbol = ? AND o.executed != 2
+          AND NOT EXISTS (
+              SELECT 1 FROM trade_signals AS c
+              WHERE c.action = 'close' AND c.symbol = o.symbol AND c.id > o.id
+          )
+        ORDER BY o.id DESC
+        LIMIT 1
+    ''', (symbol,))
+    row = cursor.fetchone()
+    if row:
+        return {'timestamp': row[0], 'price': row[1], 'leverage': row[2]}
+    return None
 
 def initialize_database(db_path: str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trade_signals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            action TEXT,
-            symbol TEXT,
-            side TEXT,
-            price REAL,
-            leverage REAL,
-            executed INTEGER DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS hourly_candles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT UNIQUE,
-            open REAL,
-            high REAL,
-            low REAL,
-            close REAL,
-            volume REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    logging.info(f"Initialized SQLite database at {db_path}.")
+    conn = get_connection(db_path)
+    with transaction(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS trade_signals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                action TEXT,
+                symbol TEXT,
+                side TEXT,
+                price REAL,
+                leverage REAL,
+                executed INTEGER DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Serves claim_pending_signals (WHERE executed = 0). The
+        # partial index only holds pending rows, so it stays a few entries
+        # long however much history the table accumulates.
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_signals_pending
+            ON trade_signals(id) WHERE executed = 0
+        ''')
+        # Narrows get_active_trade (and its no-later-close check) and
+        # mark_open_trade_executed to one symbol's opens or closes.
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_signals_action_symbol_executed
+            ON trade_signals(action, symbol, executed)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS hourly_candles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT UNIQUE,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL
+            )
+        ''')
+    logging.info("Initialized SQLite database at %s.", db_path)
 
-def get_latest_hourly_candle(db_path: str, last_processed_id: Optional[int]) -> Optional[dict]:
+def get_pending_hourly_candles(db_path: str, last_processed_id: Optional[int], limit: int = PENDING_CANDLES_BATCH_SIZE) -> list:
     """
-    Fetch the next unprocessed candle from hourly_candles.
+    Fetch up to 'limit' unprocessed candles from hourly_candles, oldest first.
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    if last_processed_id:
-        cursor.execute('''
-            SELECT id, timestamp, open, high, low, close, volume
-            FROM hourly_candles
-            WHERE id > ?
-            ORDER BY id ASC
-            LIMIT 1
-        ''', (last_processed_id,))
-    else:
-        cursor.execute('''
-            SELECT id, timestamp, open, high, low, close, volume
-            FROM hourly_candles
-            ORDER BY id ASC
-            LIMIT 1
-        ''')
+    conn = get_connection(db_path)
+    cursor = conn.execute('''
+        SELECT id, timestamp, open, high, low, close, volume
+        FROM hourly_candles
+        WHERE id > ?
+        ORDER BY id ASC
+        LIMIT ?
+    ''', (last_processed_id or 0, limit))
 
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return {
+    return [
+        {
             'id': row[0],
             'timestamp': row[1],
             'open': row[2],
@@ -130,12 +192,14 @@ def get_latest_hourly_candle(db_path: str, last_processed_id: Optional[int]) ->
             'close': row[5],
             'volume': row[6]
         }
-    return None
+        for row in cursor.fetchall()
+    ]
 
-def insert_trade_signal(db_path: str, signal: dict):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
+def insert_trade_signal(conn: sqlite3.Connection, signal: dict):
+    """
+    Insert a trade signal. The caller owns the transaction (``with transaction(conn):``).
+    """
+    conn.execute('''
         INSERT INTO trade_signals (timestamp, action, symbol, side, price, leverage)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (
@@ -146,30 +210,81 @@ def insert_trade_signal(db_path: str, signal: dict):
         signal['price'],
         signal.get('leverage', 1.0)
     ))
-    conn.commit()
-    conn.close()
-    logging.info(f"Inserted trade signal: {signal}")
-
-def mark_open_trade_executed(db_path: str, symbol: str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
+    logging.info("Inserted trade signal: %s", signal)
+
+def mark_open_trade_executed(conn: sqlite3.Connection, symbol: str):
+    """
+    Mark the pending open signal for symbol as executed. The caller owns the
+    transaction (``with transaction(conn):``).
+    """
+    conn.execute('''
         UPDATE trade_signals
         SET executed = 1
         WHERE action = 'open' AND symbol = ? AND executed = 0
     ''', (symbol,))
-    conn.commit()
-    conn.close()
-    logging.info(f"Marked corresponding open trade for {symbol} as executed.")
+    logging.info("Marked corresponding open trade for %s as executed.", symbol)
 
 class TradingLogic:
     def __init__(self):
         self.trade_active = False
         self.entry_price = 0.0
         self.leverage = 1.0
-        self.entry_time: Optional[datetime] = None
+        self.entry_time_ms: Optional[int] = None
         self.last_processed_id: Optional[int] = None
 
+        # This process owns the trade lifecycle, so the in-memory state is
+        # authoritative; the DB is only consulted here to resume after a restart.
+        active_trade = get_active_trade(get_connection(SQLITE_DB_PATH), SYMBOL)
+        if active_trade:
+            self.trade_active = True
+            self.entry_price = active_trade['price']
+            self.leverage = active_trade['leverage']
+            self.entry_time_ms = iso_to_ms(active_trade['timestamp'])
+            logging.info("Resuming active trade opened at %s.", active_trade['timestamp'])
+
+    async def process_candles_batch(self, candles: list) -> None:
+        """
+        Process a run of pending candles in order. Validation, timestamps, IBS
+        and leverage are computed for the whole run with NumPy up front; only
+        the open/close decisions go candle by candle, because each depends on
+        the trade state left by the previous one.
+        """
+        try:
+            # datetime64 parses the naive ISO strings as UTC; NULL becomes NaT.
+            timestamps = np.array([c['timestamp'] or 'NaT' for c in candles], dtype='datetime64[ms]')
+        except ValueError:
+            # A malformed timestamp somewhere in the run: validate one by one.
+            for candle in candles:
+                await self.process_candle(candle)
+                self.last_processed_id = candle['id']
+            return
+
+        # NULL prices become NaN and fail the validity mask.
+        prices = np.array(
+            [(c['high'], c['low'], c['close']) for c in candles],
+            dtype=np.float64
+        )
+        high, low, close = prices[:, 0], prices[:, 1], prices[:, 2]
+        with np.errstate(invalid='ignore'):
+            valid = ~np.isnat(timestamps) & np.isfinite(prices).all(axis=1) & (high >= low)
+            ibs = calculate_ibs_batch(close, low, high)
+            leverage = determine_leverage_batch(np.nan_to_num(ibs))
+        ts_ms = timestamps.astype(np.int64)
+
+        for i, candle in enumerate(candles):
+            if valid[i]:
+                try:
+                    await self._act_on_candle(
+                        candle['timestamp'], int(ts_ms[i]), float(close[i]),
+                        float(ibs[i]), int(leverage[i])
+                    )
+                except Exception as e:
+                    logging.error("Error processing candle: %s", e)
+            else:
+                # Rare path; process_candle logs why the candle was rejected.
+                await self.process_candle(candle)
+            self.last_processed_id = candle['id']
+
     async def process_candle(self, candle: dict) -> None:
         try:
             timestamp_str = candle.get('timestamp')
@@ -177,89 +292,109 @@ class TradingLogic:
                 logging.warning("Candle missing 'timestamp' field.")
                 return
 
-            timestamp = datetime.fromisoformat(timestamp_str)
-            open_price = float(candle.get('open', 0.0))
-            high_price = float(candle.get('high', 0.0))
-            low_price = float(candle.get('low', 0.0))
-            close_price = float(candle.get('close', 0.0))
+            ts_ms = iso_to_ms(timestamp_str)
+            # Values come straight from REAL columns, so they are already floats
+            # (or None for a NULL column).
+            high_price = candle.get('high')
+            low_price = candle.get('low')
+            close_price = candle.get('close')
+
+            if high_price is None or low_price is None or close_price is None:
+                logging.warning("Candle at %s has missing price fields, skipping.", timestamp_str)
+                return
 
             if high_price < low_price:
-                logging.warning(f"Invalid candle data: high ({high_price}) < low ({low_price}).")
+                logging.warning("Invalid candle data: high (%s) < low (%s).", high_price, low_price)
                 return
 
-            # Calculate IBS & log
             ibs = calculate_ibs(close_price, low_price, high_price)
-            logging.info(f"Candle at {timestamp_str} => IBS={ibs:.4f}")
-
-            # If we currently have no open trade
-            if not self.trade_active:
-                logging.info(f"Using database at {SQLITE_DB_PATH}")
-
-                # If there's already an active open trade, skip
-                if has_active_trade(SQLITE_DB_PATH):
-                    logging.info("Active trade found in DB, skipping new open.")
-                    return
-
-                if ibs < 0.2:
-                    self.leverage = determine_leverage(ibs)
-                    self.entry_price = close_price
-                    self.entry_time = timestamp
-                    side = "long"
-
-                    trade_signal = format_trade_signal(
-                        action="open",
-                        timestamp=timestamp_str,
-                        symbol=SYMBOL,
-                        side=side,
-                        price=self.entry_price,
-                        leverage=self.leverage
-                    )
-                    insert_trade_signal(SQLITE_DB_PATH, trade_signal)
-                    logging.info(f"Opened trade: {trade_signal}")
+            await self._act_on_candle(timestamp_str, ts_ms, close_price, ibs)
+
+        except Exception as e:
+            logging.error("Error processing candle: %s", e)
 
-                    # Immediately attempt to execute the new signal
-                    execute_pending_signals(SQLITE_DB_PATH)
-                    self.trade_active = True
+    async def _act_on_candle(self, timestamp_str: str, ts_ms: int, close_price: float, ibs: float, leverage: Optional[int] = None) -> None:
+        """
+        Open or close a trade for an already-validated candle. leverage may be
+        passed in when it was computed by process_candles_batch.
+        """
+        logging.info("Candle at %s => IBS=%.4f", timestamp_str, ibs)
 
-            else:
-                # If we've had a trade open for >= 1 hr, close
-                time_elapsed = timestamp - self.entry_time
-                if time_elapsed >= timedelta(hours=1):
-                    side = "long"
-                    trade_close_signal = format_trade_signal(
-                        action="close",
-                        timestamp=timestamp_str,
-                        symbol=SYMBOL,
-                        side=side,
-                        price=close_price
-                    )
-                    insert_trade_signal(SQLITE_DB_PATH, trade_close_signal)
-                    mark_open_trade_executed(SQLITE_DB_PATH, SYMBOL)
-                    logging.info(f"Closed trade: {trade_close_signal}")
+        conn = get_connection(SQLITE_DB_PATH)
 
-                    execute_pending_signals(SQLITE_DB_PATH)
-                    self.trade_active = False
-                    self.entry_price = 0.0
-                    self.leverage = 1.0
-                    self.entry_time = None
+        # If we currently have no open trade
+        if not self.trade_active:
+            logging.info("Using database at %s", SQLITE_DB_PATH)
 
-        except Exception as e:
-            logging.error(f"Error processing candle: {e}")
+            if ibs < 0.2:
+                self.leverage = leverage if leverage is not None else determine_leverage(ibs)
+                self.entry_price = close_price
+                self.entry_time_ms = ts_ms
+                side = "long"
+
+                trade_signal = format_trade_signal(
+                    action="open",
+                    timestamp=timestamp_str,
+                    symbol=SYMBOL,
+                    side=side,
+                    price=self.entry_price,
+                    leverage=self.leverage
+                )
+                with transaction(conn):
+                    insert_trade_signal(conn, trade_signal)
+                # The signal is committed, so the trade is active even if
+                # executing it below raises; a later candle must not open
+                # a second one.
+                self.trade_active = True
+                logging.info("Opened trade: %s", trade_signal)
+
+                # Immediately attempt to execute the new signal
+                await execute_pending_signals(SQLITE_DB_PATH)
+
+        else:
+            # If we've had a trade open for >= 1 hr, close
+            time_elapsed_ms = ts_ms - self.entry_time_ms
+            if time_elapsed_ms >= HOLD_DURATION_MS:
+                side = "long"
+                trade_close_signal = format_trade_signal(
+                    action="close",
+                    timestamp=timestamp_str,
+                    symbol=SYMBOL,
+                    side=side,
+                    price=close_price
+                )
+                # Commit the close signal and the open-signal update together
+                # before trade execution reads them on its own connection.
+                with transaction(conn):
+                    insert_trade_signal(conn, trade_close_signal)
+                    mark_open_trade_executed(conn, SYMBOL)
+                # Likewise reset as soon as the close is committed.
+                self.trade_active = False
+                self.entry_price = 0.0
+                self.leverage = 1.0
+                self.entry_time_ms = None
+                logging.info("Closed trade: %s", trade_close_signal)
+
+                await execute_pending_signals(SQLITE_DB_PATH)
 
 async def decision_making_loop(trading_logic: TradingLogic):
     while True:
-        candle = get_latest_hourly_candle(SQLITE_DB_PATH, trading_logic.last_processed_id)
-        if candle:
-            await trading_logic.process_candle(candle)
-            trading_logic.last_processed_id = candle['id']
-        await asyncio.sleep(10)
+        # Snapshot the version before querying so a commit that lands between
+        # the SELECT and the wait still wakes us up.
+        data_version = get_data_version(SQLITE_DB_PATH)
+        candles = get_pending_hourly_candles(SQLITE_DB_PATH, trading_logic.last_processed_id)
+        if candles:
+            # A full batch may mean more are waiting; query again right away.
+            await trading_logic.process_candles_batch(candles)
+            continue
+        await wait_for_new_data(SQLITE_DB_PATH, data_version)
 
 if __name__ == "__main__":
     try:
         initialize_database(SQLITE_DB_PATH)
         trading_logic = TradingLogic()
-        asyncio.run(decision_making_loop(trading_logic))
+        run(decision_making_loop(trading_logic))
     except KeyboardInterrupt:
         logging.info("Decision making stopped manually.")
     except Exception as e:
-        logging.error(f"Unexpected error: {e}")
\ No newline at end of file
+        logging.error("Unexpected error: %s", e)
\ No newline at end of file
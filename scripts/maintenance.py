@@ -3,104 +3,97 @@
 import os
 import sqlite3
 import logging
-import shutil
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
+from db import connect, transaction
+from runtime import setup_logging
+
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../config/.env'))
 
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "../database/trading.db")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("../logs/maintenance.log", mode='a')
-    ]
-)
+setup_logging("../logs/maintenance.log")
 
-def prune_old_candles(db_path: str, days: int = 30):
+def utc_cutoff(days: int) -> datetime:
     """
-    Remove hourly candles older than 'days' days.
+    Naive UTC datetime 'days' ago, comparable with the naive UTC timestamps
+    stored in hourly_candles and trade_signals.
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    rows_deleted = 0
-    try:
-        cursor.execute("SELECT id, timestamp FROM hourly_candles")
-        rows = cursor.fetchall()
-        for r in rows:
-            candle_id = r[0]
-            ts_str = r[1]
-
-            # Safely parse datetime; if it fails, skip that candle.
-            try:
-                candle_dt = datetime.fromisoformat(ts_str)
-            except ValueError as e:
-                logging.error(f"Failed to parse candle timestamp '{ts_str}': {e}")
-                continue
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
 
-            if candle_dt < cutoff:
-                cursor.execute("DELETE FROM hourly_candles WHERE id=?", (candle_id,))
-                rows_deleted += 1
+def prune_old_candles(conn: sqlite3.Connection, days: int = 30) -> int:
+    """
+    Remove hourly candles older than 'days' days. The caller owns the transaction.
+    """
+    cutoff_str = utc_cutoff(days).isoformat()
 
-        conn.commit()
-    except Exception as e:
-        logging.error(f"Error pruning old candles: {e}")
-    finally:
-        conn.close()
+    # Timestamps are stored as ISO8601 strings, which sort lexicographically,
+    # so one range DELETE on the UNIQUE(timestamp) index replaces per-row parsing.
+    cursor = conn.execute("DELETE FROM hourly_candles WHERE timestamp < ?", (cutoff_str,))
+    rows_deleted = cursor.rowcount
 
     if rows_deleted > 0:
-        logging.info(f"Pruned {rows_deleted} old candles older than {days} days.")
+        logging.info("Pruned %s old candles older than %s days.", rows_deleted, days)
+    return rows_deleted
 
-def prune_old_signals(db_path: str, days: int = 30):
+def prune_old_signals(conn: sqlite3.Connection, days: int = 30) -> int:
     """
     Remove trade signals older than 'days' days from trade_signals.
+    The caller owns the transaction.
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    cutoff_str = cutoff.isoformat()
+    cutoff_str = utc_cutoff(days).isoformat()
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    rows_deleted = 0
+    # Requires 'created_at' (datetime) in 'trade_signals' table.
+    cursor = conn.execute("DELETE FROM trade_signals WHERE created_at < DATETIME(?, 'localtime')", (cutoff_str,))
+    rows_deleted = cursor.rowcount
+
+    if rows_deleted > 0:
+        logging.info("Pruned %s old trade signals older than %s days.", rows_deleted, days)
+    return rows_deleted
+
+def prune_database(db_path: str, days: int = 30):
+    """
+    Prune old candles and signals in a single transaction (one commit for the
+    whole pass), then let SQLite refresh planner statistics with PRAGMA optimize.
+    """
+    conn = connect(db_path)
     try:
-        # Requires 'created_at' (datetime) in 'trade_signals' table.
-        cursor.execute("DELETE FROM trade_signals WHERE created_at < DATETIME(?, 'localtime')", (cutoff_str,))
-        rows_deleted = cursor.rowcount
-        conn.commit()
+        with transaction(conn):
+            prune_old_candles(conn, days)
+            prune_old_signals(conn, days)
+        conn.execute("PRAGMA optimize")
+        logging.info("Database maintenance changed %s rows.", conn.total_changes)
     except Exception as e:
-        logging.error(f"Error pruning old signals: {e}")
+        logging.error("Error pruning database: %s", e)
     finally:
         conn.close()
 
-    if rows_deleted > 0:
-        logging.info(f"Pruned {rows_deleted} old trade signals older than {days} days.")
-
 def clear_old_logs(logs_dir: str, days: int = 30):
     """
     Remove log files older than 'days' days from a logs directory,
     or simply rotate them.
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    for filename in os.listdir(logs_dir):
-        filepath = os.path.join(logs_dir, filename)
-        if os.path.isfile(filepath):
-            mtime = datetime.utcfromtimestamp(os.path.getmtime(filepath))
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    # scandir yields the file type with each entry, so only one stat per file
+    # is needed for the mtime.
+    with os.scandir(logs_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            mtime = datetime.fromtimestamp(entry.stat().st_mtime, tz=timezone.utc)
             if mtime < cutoff:
                 try:
-                    os.remove(filepath)
-                    logging.info(f"Removed old log file: {filepath}")
+                    os.remove(entry.path)
+                    logging.info("Removed old log file: %s", entry.path)
                 except Exception as e:
-                    logging.error(f"Could not remove file {filepath}: {e}")
+                    logging.error("Could not remove file %s: %s", entry.path, e)
 
 if __name__ == "__main__":
     logging.info("Starting weekly maintenance tasks...")
 
     # 1. Prune old candles/signals older than 30 days
-    prune_old_candles(SQLITE_DB_PATH, days=30)
-    prune_old_signals(SQLITE_DB_PATH, days=30)
+    prune_database(SQLITE_DB_PATH, days=30)
 
     # 2. Clear old logs in ../logs older than 30 days
     logs_path = os.path.join(os.path.dirname(__file__), '../logs')
@@ -0,0 +1,25 @@
+# scripts/pricing.py
+
+from decimal import ROUND_DOWN, Decimal
+
+# Hyperliquid perp prices may carry at most this many significant figures,
+# unless they are whole numbers, which are always accepted.
+PRICE_SIG_FIGS = 5
+MAX_PERP_PRICE_DECIMALS = 6
+
+def round_to_lot(size: Decimal, sz_decimals: int) -> Decimal:
+    """Round size down to a whole number of 10**-sz_decimals lots."""
+    return size.quantize(Decimal(1).scaleb(-sz_decimals), rounding=ROUND_DOWN)
+
+def round_price(px: float, sz_decimals: int) -> float:
+    """
+    Round a perp price to the nearest one the exchange accepts. Whole numbers
+    are returned unchanged. A fractional price is limited to 5 significant
+    figures and 6 - sz_decimals decimals, except that it is never rounded
+    coarser than a whole number: BTC at 112345.6 becomes 112346, not 112350.
+    """
+    if px.is_integer():
+        return px
+    if abs(px) >= 10 ** PRICE_SIG_FIGS:
+        return float(round(px))
+    return round(float(f"{px:.{PRICE_SIG_FIGS}g}"), MAX_PERP_PRICE_DECIMALS - sz_decimals)
@@ -2,10 +2,12 @@
 
 import os
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 from dotenv import load_dotenv
 
+from db import connect, transaction
+
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../config/.env'))
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "../database/trading.db")
@@ -24,22 +26,21 @@ def insert_mock_hourly_candle(db_path: str, timestamp: datetime, open_p: float,
     Insert a mock hourly candle into the hourly_candles table.
     If a candle with the same timestamp already exists, it will skip insertion.
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn = connect(db_path)
 
     try:
-        cursor.execute('''
-            INSERT INTO hourly_candles (timestamp, open, high, low, close, volume)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            timestamp.isoformat(),
-            open_p,
-            high_p,
-            low_p,
-            close_p,
-            volume
-        ))
-        conn.commit()
+        with transaction(conn):
+            conn.execute('''
+                INSERT INTO hourly_candles (timestamp, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                timestamp.isoformat(),
+                open_p,
+                high_p,
+                low_p,
+                close_p,
+                volume
+            ))
         logging.info(f"Inserted mock hourly candle at {timestamp.isoformat()}.")
     except sqlite3.IntegrityError:
         logging.warning(f"Hourly candle at {timestamp.isoformat()} already exists. Skipping.")
@@ -51,7 +52,7 @@ def insert_mock_hourly_candle(db_path: str, timestamp: datetime, open_p: float,
 if __name__ == "__main__":
     # Example: Insert a candle that should trigger a buy
     # Current time as a candle end time
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
 
     # Adjust these values as desired for testing:
     open_price = 100.0
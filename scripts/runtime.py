@@ -0,0 +1,44 @@
+# scripts/runtime.py
+
+import asyncio
+import atexit
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+def setup_logging(log_path: str, max_bytes: Optional[int] = None, backup_count: int = 0):
+    """
+    Log to the console and to log_path through a QueueHandler, so the event
+    loop never blocks on console or file writes: a QueueListener thread owns
+    the real handlers. With max_bytes the file rotates, keeping backup_count
+    old files.
+    """
+    if max_bytes is None:
+        file_handler = logging.FileHandler(log_path, mode='a')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path,
+            mode='a',
+            maxBytes=max_bytes,
+            backupCount=backup_count
+        )
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(), file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        handlers=[logging.handlers.QueueHandler(log_queue)]
+    )
+
+def run(main):
+    """Run the main coroutine on uvloop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        # uvloop is not available on Windows; fall back to the default loop.
+        return asyncio.run(main)
+    return uvloop.run(main)
@@ -1,124 +1,284 @@
+import asyncio
+from collections import OrderedDict
+import functools
+import json
 import os
 import sqlite3
 import logging
+import threading
 import time
 from datetime import datetime
+from decimal import Decimal
+from enum import IntFlag
+from typing import Callable, Literal, Optional, Tuple
 from dotenv import load_dotenv
 from eth_account import Account
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from hyperliquid.info import Info
 from hyperliquid.exchange import Exchange
+from hyperliquid.websocket_manager import WebsocketManager
 from hyperliquid.utils import constants
 
+from db import lazy_connection, transaction
+from pricing import round_price, round_to_lot
+from runtime import setup_logging
+
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../config/.env'))
 
 ACCOUNT_ADDRESS = os.getenv("ACCOUNT_ADDRESS")
 API_WALLET_ADDRESS = os.getenv("HYPERLIQUID_API_KEY")
 API_SECRET = os.getenv("HYPERLIQUID_API_SECRET")
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "../database/trading.db")
+HYPERLIQUID_NETWORK = os.getenv("HYPERLIQUID_NETWORK", "mainnet")
+
+API_URLS = {
+    "mainnet": constants.MAINNET_API_URL,
+    "testnet": constants.TESTNET_API_URL,
+}
 
 if not ACCOUNT_ADDRESS or not API_SECRET or not API_WALLET_ADDRESS:
     raise ValueError("Missing ACCOUNT_ADDRESS, HYPERLIQUID_API_KEY, or HYPERLIQUID_API_SECRET")
 
-api_wallet = Account.from_key(API_SECRET)
-if api_wallet.address.lower() != API_WALLET_ADDRESS.lower():
-    raise ValueError("API wallet private key does not match the API wallet address")
+# Throttled or failed /info reads are retried this many times, with
+# exponential backoff plus jitter so concurrent tasks don't retry in step.
+INFO_RETRIES = 3
 
-# Make sure you use the correct environment (Mainnet vs Testnet)
-info = Info(constants.MAINNET_API_URL, skip_ws=True)
-exchange = Exchange(
-    wallet=api_wallet,
-    base_url=constants.MAINNET_API_URL,
-    account_address=ACCOUNT_ADDRESS
-)
+def make_session(base_url: str) -> Session:
+    """
+    One keep-alive HTTP session for all REST calls, so the TLS handshake is
+    paid once instead of per client. Retry only covers failures the request
+    never got past (connection errors, plus reads for idempotent methods):
+    urllib3 does not retry POSTs after they are sent, so orders are never
+    submitted twice.
+
+    /info requests are read-only POSTs, so they get their own adapter that
+    also retries 429s and 5xx responses with backoff.
+    """
+    session = Session()
+    session.headers.update({"Content-Type": "application/json"})
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.1, backoff_jitter=0.05)
+    ))
+    session.mount(base_url + "/info", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=INFO_RETRIES,
+            backoff_factor=0.05,
+            backoff_max=2.0,
+            backoff_jitter=0.05,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            # Hand the final response back so the SDK raises its usual error.
+            raise_on_status=False
+        )
+    ))
+    return session
+
+@functools.lru_cache(maxsize=None)
+def make_clients(network: Literal["mainnet", "testnet"] = "mainnet"):
+    """
+    Build the (info, exchange) pair for a network once per process. The key
+    derivation and the meta requests made while constructing the clients are
+    shared by every caller. info is the Info the Exchange already builds for
+    itself, so meta is only fetched once.
+    """
+    if network not in API_URLS:
+        raise ValueError(f"Unknown Hyperliquid network: {network}")
+
+    api_wallet = Account.from_key(API_SECRET)
+    if api_wallet.address.lower() != API_WALLET_ADDRESS.lower():
+        raise ValueError("API wallet private key does not match the API wallet address")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("../logs/trade_execution.log", mode='a')
-    ]
+    exchange = Exchange(
+        wallet=api_wallet,
+        base_url=API_URLS[network],
+        account_address=ACCOUNT_ADDRESS
+    )
+    exchange.session = exchange.info.session = make_session(API_URLS[network])
+    return exchange.info, exchange
+
+# Make sure you use the correct environment (Mainnet vs Testnet)
+info, exchange = make_clients(HYPERLIQUID_NETWORK)
+
+# Mid prices are reused for this long so back-to-back lookups within one
+# execution pass share a single all_mids() request.
+ALL_MIDS_TTL_SECONDS = 0.5
+_all_mids_cache = (0.0, None)
+
+# Perp universe from info.meta(), keyed by coin name. szDecimals and the
+# asset list change very rarely, so meta() is fetched at most once an hour.
+META_TTL_SECONDS = 3600
+_universe_cache = (0.0, None)
+
+# First wait of the chase loop; each later one doubles, capped at the
+# loop's sleep_seconds.
+CHASE_FIRST_DELAY_SECONDS = 0.05
+
+# Waits between open_orders checks for a newly placed OID when there is no
+# live order stream. They add up to the 2 s that used to be slept outright.
+OID_REGISTRATION_DELAYS = (0.02, 0.05, 0.1, 0.2, 0.4, 0.6, 0.63)
+
+# Shared by every order. The SDK only reads order types when building the
+# order wire, so one instance is safe to reuse.
+GTC_ORDER_TYPE = {"limit": {"tif": "Gtc"}}
+SIDE_IS_BUY = {"long": True, "short": False}
+
+# Share of withdrawable margin committed to a new position.
+BUFFER_FACTOR = Decimal("0.98")
+
+# Values of trade_signals.executed. A signal is claimed while a pass is
+# executing it, then marked executed or failed.
+SIGNAL_PENDING = 0
+SIGNAL_EXECUTED = 1
+SIGNAL_FAILED = 2
+SIGNAL_CLAIMED = 3
+SIGNAL_STATUS_NAMES = {
+    SIGNAL_PENDING: "pending",
+    SIGNAL_EXECUTED: "executed",
+    SIGNAL_FAILED: "failed",
+    SIGNAL_CLAIMED: "claimed",
+}
+
+# Last leverage the exchange accepted from set_leverage(), per coin, so an
+# unchanged value skips the signed update_leverage request. A missing coin
+# means unknown.
+_current_leverage: dict = {}
+
+# Set once this process has settled signals left claimed by an earlier one.
+_claims_reconciled = False
+
+# PRAGMA data_version as of the last claim; None forces the next pass to claim.
+_signals_data_version = None
+
+# One connection is opened by get_connection() and reused for every signal.
+# Only the event loop thread touches it; worker threads run exchange calls.
+get_connection = lazy_connection()
+
+# Signals for different symbols run concurrently, at most this many symbols
+# at a time; signals for the same symbol still run one after another.
+MAX_CONCURRENT_SYMBOLS = 8
+
+# The SDK signs every exchange action with the current time in ms as its
+# nonce, so two actions sent from concurrent threads in the same ms would
+# collide. signed() sends them one at a time.
+_EXCHANGE_LOCK = threading.Lock()
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# The chase loop logs heavily; rotating keeps the file bounded, and
+# maintenance.clear_old_logs removes rotated files once they age out.
+setup_logging(
+    "../logs/trade_execution.log",
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT
 )
 
 # -------------------------------------------------------------------------
 # Database / signal helpers
 # -------------------------------------------------------------------------
-def get_unexecuted_signals(db_path: str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, timestamp, action, symbol, side, price, leverage
-        FROM trade_signals
-        WHERE executed = 0
-        ORDER BY id ASC
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-
-    results = []
-    for row in rows:
-        results.append({
-            'id': row[0],
-            'timestamp': row[1],
-            'action': row[2],
-            'symbol': row[3],
-            'side': row[4],
-            'price': float(row[5]),
-            'leverage': int(row[6]) if row[6] else 1
-        })
-    return results
-
-def mark_signal_executed(db_path: str, signal_id: int):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE trade_signals
-        SET executed = 1
-        WHERE id = ?
-    ''', (signal_id,))
-    conn.commit()
-    conn.close()
-    logging.info(f"Marked signal {signal_id} as executed.")
-
-def mark_signal_failed(db_path: str, signal_id: int):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE trade_signals
-        SET executed = 2
-        WHERE id = ?
-    ''', (signal_id,))
-    conn.commit()
-    conn.close()
-    logging.info(f"Marked signal {signal_id} as failed.")
-
-def get_size_decimals():
-    meta_data = info.meta()
-    btc_info = next((x for x in meta_data["universe"] if x["name"] == "BTC"), None)
-    if not btc_info:
-        raise ValueError("BTC not found in meta data")
-    return btc_info["szDecimals"]
-
-def set_leverage(leverage: int):
-    resp = exchange.update_leverage(leverage, "BTC", is_cross=True)
+def claim_pending_signals(db_path: str, conn: Optional[sqlite3.Connection] = None) -> list:
+    """
+    Atomically mark every pending signal as claimed and return the claimed
+    rows as sqlite3.Row objects, oldest first. A second runner, or this one
+    after a restart, cannot pick up a signal that is already being executed.
+    """
+    conn = conn or get_connection(db_path)
+    with transaction(conn):
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        rows = cursor.execute('''
+            UPDATE trade_signals
+            SET executed = ?
+            WHERE executed = 0
+            RETURNING id, timestamp, action, symbol, side, price, leverage
+        ''', (SIGNAL_CLAIMED,)).fetchall()
+    # RETURNING yields rows in no particular order.
+    rows.sort(key=lambda row: row["id"])
+    return rows
+
+def mark_signals(db_path: str, rows: list, conn: Optional[sqlite3.Connection] = None):
+    """
+    Write a batch of (executed, id) status rows with one executemany/commit.
+    """
+    if not rows:
+        return
+    conn = conn or get_connection(db_path)
+    with transaction(conn):
+        conn.executemany('''
+            UPDATE trade_signals
+            SET executed = ?
+            WHERE id = ?
+        ''', rows)
+    for status, signal_id in rows:
+        logging.info("Marked signal %s as %s.", signal_id, SIGNAL_STATUS_NAMES[status])
+
+def get_universe() -> dict:
+    global _universe_cache
+    fetched_at, universe = _universe_cache
+    now = time.monotonic()
+    if universe is None or now - fetched_at > META_TTL_SECONDS:
+        universe = {x["name"]: x for x in info.meta()["universe"]}
+        _universe_cache = (now, universe)
+    return universe
+
+def get_size_decimals(coin: str = "BTC"):
+    coin_info = get_universe().get(coin)
+    if not coin_info:
+        raise ValueError(f"{coin} not found in meta data")
+    return coin_info["szDecimals"]
+
+def get_all_mids() -> dict:
+    global _all_mids_cache
+    fetched_at, all_mids = _all_mids_cache
+    now = time.monotonic()
+    if all_mids is None or now - fetched_at > ALL_MIDS_TTL_SECONDS:
+        all_mids = info.all_mids()
+        _all_mids_cache = (now, all_mids)
+    return all_mids
+
+def signed(action, *args, **kwargs):
+    """Call a signed exchange action while holding _EXCHANGE_LOCK."""
+    with _EXCHANGE_LOCK:
+        return action(*args, **kwargs)
+
+async def set_leverage(leverage: int, coin: str = "BTC"):
+    if _current_leverage.get(coin) == leverage:
+        return
+    resp = await asyncio.to_thread(signed, exchange.update_leverage, leverage, coin, is_cross=True)
     if resp.get("status") == "err":
-        logging.error(f"Failed to set leverage to {leverage}: {resp}")
+        _current_leverage.pop(coin, None)
+        logging.error("Failed to set %s leverage to %s: %s", coin, leverage, resp)
     else:
-        logging.info(f"Set leverage to {leverage}x successfully.")
+        _current_leverage[coin] = leverage
+        logging.info("Set %s leverage to %sx successfully.", coin, leverage)
 
 # -------------------------------------------------------------------------
 # Position / Fill Helpers
 # -------------------------------------------------------------------------
-def get_btc_position() -> float:
-    """Return the user's current BTC position size (szi)."""
-    user_state = info.user_state(ACCOUNT_ADDRESS)
-    positions = user_state.get("assetPositions", [])
-    for p in positions:
-        pos = p["position"]
-        if pos["coin"] == "BTC":
-            return float(pos["szi"])
-    return 0.0
+async def get_user_state(cached: Optional[dict] = None) -> dict:
+    """Return cached if given, otherwise fetch the account's user_state."""
+    if cached is not None:
+        return cached
+    return await asyncio.to_thread(info.user_state, ACCOUNT_ADDRESS)
+
+def position_index(user_state: dict) -> dict:
+    """Map coin name to its position entry from a user_state snapshot."""
+    return {p["position"]["coin"]: p["position"] for p in user_state.get("assetPositions", [])}
+
+async def get_position(coin: str = "BTC", user_state: Optional[dict] = None) -> float:
+    """
+    Return the user's current position size (szi) in coin, read from
+    user_state when a fresh snapshot is passed in.
+    """
+    user_state = await get_user_state(user_state)
+    return float(position_index(user_state).get(coin, {}).get("szi", 0.0))
 
 def check_position_change(old_pos: float, new_pos: float, side: str, trade_size: float) -> bool:
     """
@@ -133,22 +293,187 @@ def check_position_change(old_pos: float, new_pos: float, side: str, trade_size:
         expected = old_pos - trade_size
     return abs(new_pos - expected) < tolerance
 
+class OrderOutcome(IntFlag):
+    """How place_limit_order_with_chase_openorders left an order."""
+    FILLED = 1
+    RESTING = 2
+    ERROR = 4
+    # Set alongside FILLED when the fill was inferred from a position change.
+    FALLBACK = 8
+
+# -------------------------------------------------------------------------
+# Order Stream: orderUpdates + bbo over WebSocket
+# -------------------------------------------------------------------------
+class AckingWebsocketManager(WebsocketManager):
+    """
+    WebsocketManager that reports the server's subscriptionResponse acks,
+    which the SDK drops. on_ack is called on the SDK thread with the
+    acknowledged subscription.
+    """
+
+    def __init__(self, base_url: str, on_ack):
+        self._on_ack = on_ack
+        # The SDK binds self.on_message in its __init__, so the override below
+        # is the one the socket uses.
+        super().__init__(base_url)
+
+    def on_message(self, _ws, message):
+        # The channel name leads every message, so a prefix check keeps the
+        # extra parse off ordinary updates.
+        if '"subscriptionResponse"' in message[:64]:
+            ws_msg = json.loads(message)
+            if ws_msg.get("channel") == "subscriptionResponse":
+                self._on_ack(ws_msg["data"]["subscription"])
+                return
+        super().on_message(_ws, message)
+
+class OrderEvents:
+    """
+    Push-based order and quote state from Hyperliquid's WebSocket feed, so the
+    chase loop learns about fills without polling open_orders/user_fills.
+
+    The SDK's WebsocketManager delivers messages on its own thread; order
+    updates are applied on the event loop with call_soon_threadsafe. When the
+    socket is down (the SDK does not reconnect), is_live() is False and the
+    chase loop falls back to REST, and start() opens a new socket next pass.
+    The chase only treats silence as "still resting" for orders placed after
+    the server acknowledged the orderUpdates subscription (see tracker()).
+    """
+
+    # Final statuses are kept for this many recent orders, so a fill that
+    # arrives before the chase starts waiting is not missed.
+    MAX_TRACKED_ORDERS = 256
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        # Coins whose bbo is streamed, and the mid of each one's best
+        # bid/offer once its first update has arrived.
+        self._coins: set = set()
+        self._mids: dict = {}
+        self._manager: Optional[WebsocketManager] = None
+        # The manager whose orderUpdates subscription the server has
+        # acknowledged; only orders placed after that are sure to be reported.
+        self._acked_manager: Optional[WebsocketManager] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._final_statuses: OrderedDict = OrderedDict()
+        self._waiters: dict = {}
+
+    def start(self):
+        """Open the socket and subscribe, unless a live one is already running."""
+        if self._manager is not None and self._manager.is_alive():
+            return
+        if self._manager is not None:
+            self._manager.stop()
+        self._loop = asyncio.get_running_loop()
+        self._mids.clear()
+        self._manager = AckingWebsocketManager(self.base_url, self._on_ack)
+        # Neither SDK thread should keep the process alive on exit.
+        self._manager.daemon = True
+        self._manager.ping_sender.daemon = True
+        self._manager.start()
+        self._manager.subscribe({"type": "orderUpdates", "user": ACCOUNT_ADDRESS}, self._on_order_updates)
+        for coin in self._coins:
+            self._manager.subscribe({"type": "bbo", "coin": coin}, self._on_bbo)
+
+    def watch(self, coin: str):
+        """Stream coin's bbo from now on (and after any restart)."""
+        if coin in self._coins:
+            return
+        self._coins.add(coin)
+        if self._manager is not None and self._manager.is_alive():
+            self._manager.subscribe({"type": "bbo", "coin": coin}, self._on_bbo)
+
+    def mid(self, coin: str) -> Optional[float]:
+        return self._mids.get(coin)
+
+    def is_live(self) -> bool:
+        return self._manager is not None and self._manager.ws_ready and self._manager.is_alive()
+
+    def tracker(self) -> Optional[WebsocketManager]:
+        """
+        The live socket once its orderUpdates subscription is acknowledged,
+        else None. An order placed while tracker() is some socket has no
+        missed updates for as long as tracker() still returns that socket.
+        """
+        if self.is_live() and self._acked_manager is self._manager:
+            return self._manager
+        return None
+
+    def _on_ack(self, subscription: dict):
+        if subscription.get("type") == "orderUpdates":
+            # A single attribute store, safe to do from the SDK thread.
+            self._acked_manager = self._manager
+
+    def _on_order_updates(self, msg: dict):
+        self._loop.call_soon_threadsafe(self._apply_order_updates, msg["data"])
+
+    def _apply_order_updates(self, updates: list):
+        for update in updates:
+            status = update.get("status")
+            if status in ("open", "triggered"):
+                continue
+            oid = update["order"]["oid"]
+            self._final_statuses[oid] = status
+            if len(self._final_statuses) > self.MAX_TRACKED_ORDERS:
+                self._final_statuses.popitem(last=False)
+            waiter = self._waiters.get(oid)
+            if waiter is not None:
+                waiter.set()
+
+    def _on_bbo(self, msg: dict):
+        bid, ask = msg["data"]["bbo"]
+        if bid and ask:
+            # A single dict store, safe to do from the SDK thread.
+            self._mids[msg["data"]["coin"]] = (float(bid["px"]) + float(ask["px"])) / 2
+
+    async def wait(self, oid: int, timeout: float) -> Optional[str]:
+        """
+        Sleep up to timeout seconds, returning early once the feed reports a
+        final status for oid. Returns that status, or None if there is none.
+        """
+        if oid not in self._final_statuses:
+            waiter = self._waiters.setdefault(oid, asyncio.Event())
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiters.pop(oid, None)
+        return self._final_statuses.get(oid)
+
+ORDER_EVENTS = OrderEvents(API_URLS[HYPERLIQUID_NETWORK])
+
+async def wait_for_open_order(oid: int) -> bool:
+    """
+    Poll open_orders with short, growing waits until oid is listed, giving up
+    after OID_REGISTRATION_DELAYS. Returns whether the order was seen.
+    """
+    for delay in OID_REGISTRATION_DELAYS:
+        await asyncio.sleep(delay)
+        open_orders = await asyncio.to_thread(info.open_orders, ACCOUNT_ADDRESS)
+        if any(o.get("oid") == oid for o in open_orders):
+            return True
+    return False
+
 # -------------------------------------------------------------------------
 # Chasing Function: Use open_orders + user_fills + fallback
 # -------------------------------------------------------------------------
-def place_limit_order_with_chase_openorders(
+async def place_limit_order_with_chase_openorders(
     side: str,
     size: float,
     initial_price: float,
     reduce_only: bool = False,
     max_requotes: int = 5,
-    sleep_seconds: float = 2.0
-):
+    sleep_seconds: float = 2.0,
+    user_state: Optional[dict] = None,
+    coin: str = "BTC",
+    on_placed: Optional[Callable[[], None]] = None
+) -> Tuple[OrderOutcome, Optional[int]]:
     """
     Places a limit order and tries to chase using OID, but only checks
     open_orders + user_fills + position fallback.
 
-    1) Record old BTC position.
+    1) Record the old position in coin.
     2) Place the order => parse OID.
        - If instantly filled, done.
     3) Sleep + loop up to max_requotes times:
@@ -157,143 +482,174 @@ def place_limit_order_with_chase_openorders(
        b) if OID not in open_orders => check user_fills for OID => if found => filled
           if not found => check position fallback => if changed => treat as filled
           else => keep going or fail
-    4) Return an OK or ERR style dict with "response.data.statuses"
+    4) Return (outcome, oid): an OrderOutcome flag set and the order's OID,
+       or None when it never rested
+
+    user_state, when given, is the caller's snapshot taken just before the
+    order and saves re-fetching it for the starting position.
+
+    on_placed, when given, is called once the placement request has returned
+    (whatever its result), before any chasing.
 
     This approach does not call query_order_by_oid, as that can sometimes fail to
     find the OID quickly.
+
+    The waits between checks start at CHASE_FIRST_DELAY_SECONDS and double
+    each attempt up to sleep_seconds.
+
+    Every exchange call runs in a worker thread via asyncio.to_thread and the
+    waits use asyncio.sleep, so the event loop keeps serving other coroutines
+    while an order is being chased.
     """
-    is_buy = (side == "long")
-    old_pos = get_btc_position()
+    is_buy = SIDE_IS_BUY[side]
+    old_pos = await get_position(coin, user_state)
+    sz_decimals = get_size_decimals(coin)
+    ORDER_EVENTS.watch(coin)
 
-    logging.info(f"Placing OID-based limit order. side={side}, size={size}, price={initial_price}, reduce_only={reduce_only}")
+    logging.info("Placing OID-based limit order. side=%s, size=%s, price=%s, reduce_only=%s", side, size, initial_price, reduce_only)
 
-    order_type = {"limit": {"tif": "Gtc"}}
+    order_type = GTC_ORDER_TYPE
+    # Taken before placing: "no update means resting" only holds for an order
+    # the stream was already subscribed for when it was placed.
+    tracker = ORDER_EVENTS.tracker()
     # Place the order
-    resp = exchange.order(
-        name="BTC",
-        is_buy=is_buy,
-        sz=size,
-        limit_px=initial_price,
-        order_type=order_type,
+    resp = await asyncio.to_thread(
+        signed,
+        exchange.order,
+        coin,
+        is_buy,
+        size,
+        initial_price,
+        order_type,
         reduce_only=reduce_only
     )
+    if on_placed is not None:
+        on_placed()
     if resp.get("status") == "err":
-        logging.error(f"Initial order placement failed: {resp}")
-        return {
-            "status": "err",
-            "response": {"data": {"statuses": ["error: initial order placement failed"]}}
-        }
+        logging.error("Initial order placement failed: %s", resp)
+        return OrderOutcome.ERROR, None
 
-    # Parse OID
     statuses_info = resp.get("response", {}).get("data", {}).get("statuses", [])
     if not statuses_info:
-        logging.error(f"No 'statuses' in order response. Full resp: {resp}")
-        return {
-            "status": "err",
-            "response": {"data": {"statuses": ["error: no statuses in response"]}}
-        }
+        logging.error("No 'statuses' in order response. Full resp: %s", resp)
+        return OrderOutcome.ERROR, None
 
     first_status = statuses_info[0]
     if "error" in first_status:
-        logging.error(f"Order returned error in statuses: {first_status}")
-        return {
-            "status": "err",
-            "response": {"data": {"statuses": ["error: order placement returned error"]}}
-        }
+        logging.error("Order returned error in statuses: %s", first_status)
+        return OrderOutcome.ERROR, None
 
     # If instantly filled, we might see something like {"filled": {...}}
     if "filled" in first_status:
         logging.info("Order was instantly filled on placement.")
-        return {
-            "status": "ok",
-            "response": {"data": {"statuses": ["filled-immediate"]}}
-        }
+        return OrderOutcome.FILLED, None
 
     if "resting" not in first_status:
-        logging.warning(f"Unexpected immediate status: {first_status}")
-        return {
-            "status": "err",
-            "response": {"data": {"statuses": ["error: unknown immediate status"]}}
-        }
+        logging.warning("Unexpected immediate status: %s", first_status)
+        return OrderOutcome.ERROR, None
 
     oid = first_status["resting"]["oid"]
-    logging.info(f"Order is resting with OID={oid}.")
+    logging.info("Order is resting with OID=%s.", oid)
 
-    # Let the exchange register the OID in open_orders
-    time.sleep(2.0)
+    # Let the exchange register the OID in open_orders. Only the REST checks
+    # need this; a tracking stream reports on the OID as soon as it exists.
+    if tracker is None:
+        await wait_for_open_order(oid)
 
     current_price = initial_price
 
+    # Every attempt either requotes and continues or returns, and the last
+    # one always returns, so the loop never falls through.
     for attempt in range(max_requotes + 1):
-        time.sleep(sleep_seconds)
-
-        # (a) check open_orders
-        all_open = info.open_orders(ACCOUNT_ADDRESS)
-        if isinstance(all_open, dict) and all_open.get("status") == "err":
-            # If for some reason open_orders also fails, we can do a quick fallback
-            logging.warning("open_orders returned err; continuing fallback checks.")
-
-        # parse open orders
-        open_orders_list = []
-        if isinstance(all_open, list):
-            open_orders_list = all_open
-        elif isinstance(all_open, dict) and "response" in all_open:
-            # some older versions might return a dict with response/data. 
-            # Typically though open_orders is just a list. 
-            # We'll unify to open_orders_list if you see a different structure.
-            pass
-
-        found_oid = None
-        for o in open_orders_list:
-            # o might look like: {"coin":"BTC","limitPx":"10000","oid":12345,"side":"A","sz":"0.01","timestamp":1692217107273}
-            if "oid" in o and o["oid"] == oid:
-                found_oid = o
-                break
+        # Poll quickly at first and back off while the order keeps resting,
+        # up to sleep_seconds. Wakes early if the order stream reports the
+        # order off the book.
+        delay = min(sleep_seconds, CHASE_FIRST_DELAY_SECONDS * 2 ** attempt)
+        status = await ORDER_EVENTS.wait(oid, delay)
+        if status == "filled":
+            logging.info("OID=%s reported filled by orderUpdates.", oid)
+            return OrderOutcome.FILLED, oid
+
+        if status is None and tracker is not None and ORDER_EVENTS.tracker() is tracker:
+            # No final update from a stream that has tracked the order since
+            # it was placed, so it is still resting; requote off the
+            # streamed BBO.
+            found_oid = True
+            new_mid = ORDER_EVENTS.mid(coin)
+            if new_mid is None:
+                mid_str = (await asyncio.to_thread(get_all_mids)).get(coin)
+                new_mid = float(mid_str) if mid_str else None
+        else:
+            # Canceled/rejected, or no tracking stream: confirm over REST.
+            # (a) check open_orders; the mid for a possible requote is fetched
+            # alongside it rather than after it
+            all_open, all_mids = await asyncio.gather(
+                asyncio.to_thread(info.open_orders, ACCOUNT_ADDRESS),
+                asyncio.to_thread(get_all_mids)
+            )
+            if isinstance(all_open, dict) and all_open.get("status") == "err":
+                # If for some reason open_orders also fails, we can do a quick fallback
+                logging.warning("open_orders returned err; continuing fallback checks.")
+
+            # parse open orders
+            open_orders_list = []
+            if isinstance(all_open, list):
+                open_orders_list = all_open
+            elif isinstance(all_open, dict) and "response" in all_open:
+                # some older versions might return a dict with response/data. 
+                # Typically though open_orders is just a list. 
+                # We'll unify to open_orders_list if you see a different structure.
+                pass
+
+            found_oid = None
+            for o in open_orders_list:
+                # o might look like: {"coin":"BTC","limitPx":"10000","oid":12345,"side":"A","sz":"0.01","timestamp":1692217107273}
+                if "oid" in o and o["oid"] == oid:
+                    found_oid = o
+                    break
+
+            mid_str = all_mids.get(coin)
+            new_mid = float(mid_str) if mid_str else None
 
         if found_oid:
             # It's still resting or partially filled
-            logging.info(f"OID={oid} is still in open_orders => resting or partial fill.")
+            logging.info("OID=%s is still in open_orders => resting or partial fill.", oid)
             if attempt < max_requotes:
-                # chase by modifying
-                all_mids = info.all_mids()
-                btc_mid_str = all_mids.get("BTC")
-                if btc_mid_str:
-                    new_mid = float(btc_mid_str)
-                    current_price = int(round(new_mid))
-
-                logging.info(f"[Chase Attempt {attempt+1}] Modifying OID={oid} to new price={current_price}")
-                modify_resp = exchange.modify_order(
-                    oid,
-                    "BTC",
-                    is_buy,
-                    size,
-                    current_price,
-                    order_type,
-                    reduce_only=reduce_only
-                )
-                if modify_resp.get("status") == "err":
-                    logging.error(f"Modify order failed: {modify_resp}")
-                    return {
-                        "status": "err",
-                        "response": {"data": {"statuses": ["error: modify_order failed"]}}
-                    }
+                # chase by modifying; a modify is a signed, rate-limited
+                # action, so it is only sent when the quote actually moves
+                new_price = round_price(new_mid, sz_decimals) if new_mid else current_price
+                if new_price == current_price:
+                    logging.info("[Chase Attempt %s] Price unchanged at %s, leaving OID=%s resting.", attempt+1, current_price, oid)
+                else:
+                    current_price = new_price
+                    logging.info("[Chase Attempt %s] Modifying OID=%s to new price=%s", attempt+1, oid, current_price)
+                    modify_resp = await asyncio.to_thread(
+                        signed,
+                        exchange.modify_order,
+                        oid,
+                        coin,
+                        is_buy,
+                        size,
+                        current_price,
+                        order_type,
+                        reduce_only=reduce_only
+                    )
+                    if modify_resp.get("status") == "err":
+                        logging.error("Modify order failed: %s", modify_resp)
+                        return OrderOutcome.ERROR, oid
             else:
-                logging.info(f"Max re-quotes reached for OID={oid}. Returning resting.")
-                return {
-                    "status": "ok",
-                    "response": {
-                        "data": {
-                            "statuses": ["resting"],
-                            "oid": oid
-                        }
-                    }
-                }
+                logging.info("Max re-quotes reached for OID=%s. Returning resting.", oid)
+                return OrderOutcome.RESTING, oid
         else:
             # Not in open_orders => maybe filled?
-            logging.info(f"OID={oid} not found in open_orders => checking user_fills and position fallback...")
+            logging.info("OID=%s not found in open_orders => checking user_fills and position fallback...", oid)
 
-            # (b) check user_fills
-            fills_resp = info.user_fills(ACCOUNT_ADDRESS)
+            # (b) check user_fills, fetching the position for the fallback
+            # check in the same round-trip
+            fills_resp, new_pos = await asyncio.gather(
+                asyncio.to_thread(info.user_fills, ACCOUNT_ADDRESS),
+                get_position(coin)
+            )
             if isinstance(fills_resp, dict) and fills_resp.get("status") == "err":
                 logging.warning("user_fills returned err; continuing fallback checks.")
                 fills_list = []
@@ -306,152 +662,287 @@ def place_limit_order_with_chase_openorders(
             # see if any fill references our OID
             found_fill = any((f.get("oid") == oid) for f in fills_list)
             if found_fill:
-                logging.info(f"OID={oid} found in user_fills => it was filled.")
-                return {
-                    "status": "ok",
-                    "response": {"data": {"statuses": ["filled"]}}
-                }
+                logging.info("OID=%s found in user_fills => it was filled.", oid)
+                return OrderOutcome.FILLED, oid
 
             # if not in user_fills, last fallback => position changed?
-            new_pos = get_btc_position()
             if check_position_change(old_pos, new_pos, side, size):
-                logging.info(f"Fallback => position changed => OID={oid} likely filled instantly.")
-                return {
-                    "status": "ok",
-                    "response": {"data": {"statuses": ["filled-fallback"]}}
-                }
+                logging.info("Fallback => position changed => OID=%s likely filled instantly.", oid)
+                return OrderOutcome.FILLED | OrderOutcome.FALLBACK, oid
 
             # else we can't find it => might have been canceled externally, or just no data
-            logging.warning(f"OID={oid} not found in open_orders or user_fills, no position change. Possibly an error or external cancel.")
-            return {
-                "status": "err",
-                "response": {
-                    "data": {
-                        "statuses": ["error: OID not open, not filled, no fallback fill"]
-                    }
-                }
-            }
-
-    # If we exit the loop, do a final fallback check
-    new_pos = get_btc_position()
-    if check_position_change(old_pos, new_pos, side, size):
-        logging.info(f"Final fallback => position changed => OID={oid} must have filled.")
-        return {
-            "status": "ok",
-            "response": {"data": {"statuses": ["filled-final-fallback"]}}
-        }
-
-    return {
-        "status": "err",
-        "response": {
-            "data": {
-                "statuses": ["error: chase loop ended, no fill detected"]
-            }
-        }
-    }
+            logging.warning("OID=%s not found in open_orders or user_fills, no position change. Possibly an error or external cancel.", oid)
+            return OrderOutcome.ERROR, oid
 
 # -------------------------------------------------------------------------
 # Main Execution of Pending Signals
 # -------------------------------------------------------------------------
-def execute_pending_signals(db_path: str):
-    sz_decimals = get_size_decimals()
-    signals = get_unexecuted_signals(db_path)
-    if not signals:
-        logging.info("No unexecuted trade signals found.")
-        return
-
-    for sig in signals:
-        signal_id = sig["id"]
-        action = sig["action"]
-        side = sig["side"]
-        leverage = sig["leverage"]
-        price = sig["price"]  # not used except for logging
-
-        logging.info(f"Executing signal {signal_id} => {sig}")
-
-        if action == "open":
-            # Set leverage
-            set_leverage(leverage)
-
-            user_state = info.user_state(ACCOUNT_ADDRESS)
-            withdrawable_str = user_state.get("withdrawable", "0")
-            withdrawable = float(withdrawable_str)
-
-            all_mids = info.all_mids()
-            btc_mid_str = all_mids.get("BTC")
-            if not btc_mid_str:
-                logging.error("BTC mid price not found, marking failed.")
-                mark_signal_failed(db_path, signal_id)
-                continue
-            btc_mid = float(btc_mid_str)
-
-            BUFFER_FACTOR = 0.98
-            trade_size = (withdrawable * leverage) / btc_mid
-            trade_size *= BUFFER_FACTOR
-            trade_size = round(trade_size, sz_decimals)
-
-            if trade_size <= 0:
-                logging.error(f"Trade size <= 0 for signal {signal_id}, skipping.")
-                mark_signal_failed(db_path, signal_id)
-                continue
+def release_once(lock: asyncio.Lock) -> Callable[[], None]:
+    """Return a callable that releases lock the first time it is called."""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            lock.release()
+    return release
+
+async def execute_symbol_signals(
+    db_path: str,
+    conn: sqlite3.Connection,
+    signals: list,
+    started: set,
+    margin_lock: asyncio.Lock
+):
+    """
+    Execute one symbol's claimed signals in id order, adding each id to
+    started before its signal is handled.
 
-            rounded_price = int(round(btc_mid))
-            resp = place_limit_order_with_chase_openorders(
-                side=side,
-                size=trade_size,
-                initial_price=rounded_price,
-                reduce_only=False
-            )
+    margin_lock is shared by every symbol in the pass. An open holds it from
+    reading withdrawable until its order has been placed, so concurrent opens
+    never size from the same margin.
+    """
+    # Statuses are collected as (executed, id) rows and written together.
+    # They are flushed as soon as an order has been sent, so a crash can never
+    # replay a signal the exchange has already seen; signals that fail before
+    # reaching the exchange just ride along with the next flush.
+    pending = []
+    # Account state is fetched once per symbol and only refetched after an
+    # order has rested or filled, since nothing else changes withdrawable or
+    # positions.
+    # Mid prices come from get_all_mids(), which shares one request per TTL.
+    user_state = None
+    signal_id = None
+    try:
+        for sig in signals:
+            started.add(sig["id"])
+            signal_id = sig["id"]
+            action = sig["action"]
+            side = sig["side"]
+            leverage = int(sig["leverage"] or 1)
+            coin = sig["symbol"]
+
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info("Executing signal %s => %s", signal_id, dict(sig))
+
+            if action == "open":
+                await margin_lock.acquire()
+                release_margin = release_once(margin_lock)
+                try:
+                    # Another symbol's open may have used margin since this
+                    # task's snapshot, so the account is always read fresh
+                    # here. Setting leverage, reading the account and reading
+                    # mids are independent requests, so they are in flight
+                    # together.
+                    _, user_state, all_mids = await asyncio.gather(
+                        set_leverage(leverage, coin),
+                        get_user_state(),
+                        asyncio.to_thread(get_all_mids)
+                    )
+                    withdrawable_str = user_state.get("withdrawable", "0")
+
+                    mid_str = all_mids.get(coin)
+                    if not mid_str:
+                        logging.error("%s mid price not found, marking failed.", coin)
+                        pending.append((SIGNAL_FAILED, signal_id))
+                        continue
+                    sz_decimals = get_size_decimals(coin)
+
+                    # Sized in Decimal from the API's decimal strings and
+                    # rounded down to the lot size, so it never exceeds the
+                    # margin or lands off the szDecimals grid.
+                    trade_size = Decimal(withdrawable_str) * leverage / Decimal(mid_str)
+                    trade_size = float(round_to_lot(trade_size * BUFFER_FACTOR, sz_decimals))
+
+                    if trade_size <= 0:
+                        logging.error("Trade size <= 0 for signal %s, skipping.", signal_id)
+                        pending.append((SIGNAL_FAILED, signal_id))
+                        continue
+
+                    rounded_price = round_price(float(mid_str), sz_decimals)
+                    # The lock is released as soon as the order is placed, so
+                    # the chase itself runs alongside other symbols.
+                    outcome, oid = await place_limit_order_with_chase_openorders(
+                        side=side,
+                        size=trade_size,
+                        initial_price=rounded_price,
+                        reduce_only=False,
+                        user_state=user_state,
+                        coin=coin,
+                        on_placed=release_margin
+                    )
+                finally:
+                    release_margin()
+                # Whatever happened to the order, margin has moved or may
+                # move, so the next signal starts from a fresh read.
+                user_state = None
+
+            elif action == "close":
+                user_state, all_mids = await asyncio.gather(
+                    get_user_state(user_state),
+                    asyncio.to_thread(get_all_mids)
+                )
+                position_size = Decimal(position_index(user_state).get(coin, {}).get("szi", "0"))
+
+                if position_size == 0:
+                    logging.info("No %s position to close for signal %s, marking executed.", coin, signal_id)
+                    pending.append((SIGNAL_EXECUTED, signal_id))
+                    continue
+
+                sz_decimals = get_size_decimals(coin)
+                close_size = float(round_to_lot(abs(position_size), sz_decimals))
+
+                mid_str = all_mids.get(coin)
+                if not mid_str:
+                    logging.error("%s mid price not found, marking failed.", coin)
+                    pending.append((SIGNAL_FAILED, signal_id))
+                    continue
+
+                rounded_price = round_price(float(mid_str), sz_decimals)
+                opposite_side = "short" if side == "long" else "long"
+
+                outcome, oid = await place_limit_order_with_chase_openorders(
+                    side=opposite_side,
+                    size=close_size,
+                    initial_price=rounded_price,
+                    reduce_only=True,
+                    user_state=user_state,
+                    coin=coin
+                )
 
-            if resp.get("status") == "err":
-                mark_signal_failed(db_path, signal_id)
             else:
-                statuses = resp["response"]["data"].get("statuses", [])
-                if any("error" in s for s in statuses):
-                    mark_signal_failed(db_path, signal_id)
-                else:
-                    mark_signal_executed(db_path, signal_id)
-
-        elif action == "close":
-            user_state = info.user_state(ACCOUNT_ADDRESS)
-            positions = user_state.get("assetPositions", [])
-            position_size = 0.0
-            for p in positions:
-                pos = p["position"]
-                if pos["coin"] == "BTC":
-                    position_size = float(pos["szi"])
-                    break
-
-            if position_size == 0:
-                logging.info(f"No BTC position to close for signal {signal_id}, marking executed.")
-                mark_signal_executed(db_path, signal_id)
+                logging.error("Unknown action %r for signal %s, marking failed.", action, signal_id)
+                pending.append((SIGNAL_FAILED, signal_id))
                 continue
 
-            close_size = round(abs(position_size), sz_decimals)
-
-            all_mids = info.all_mids()
-            btc_mid_str = all_mids.get("BTC")
-            if not btc_mid_str:
-                logging.error("BTC mid price not found, marking failed.")
-                mark_signal_failed(db_path, signal_id)
-                continue
-            btc_mid = float(btc_mid_str)
+            # Keep the snapshot if no order ever reached the book; anything
+            # that rested or filled may have moved margin or the position.
+            if oid is not None or outcome & OrderOutcome.FILLED:
+                user_state = None
+            if outcome & OrderOutcome.ERROR:
+                pending.append((SIGNAL_FAILED, signal_id))
+            else:
+                pending.append((SIGNAL_EXECUTED, signal_id))
+            mark_signals(db_path, pending, conn)
+            pending.clear()
+    except BaseException:
+        # The order for this signal may or may not have reached the exchange,
+        # so it is left claimed rather than retried; the next process to run
+        # execute_pending_signals settles it in reconcile_claimed_signals().
+        if signal_id is not None:
+            logging.error("Execution pass aborted while handling signal %s; it stays claimed.", signal_id)
+        raise
+    finally:
+        mark_signals(db_path, pending, conn)
+
+def order_reached_exchange(sig: sqlite3.Row, open_orders: list, fills: list) -> bool:
+    """
+    Whether a claimed signal's order shows up on the exchange: as a resting
+    order in its coin and direction, or as a fill in that direction made
+    after the signal was written.
+    """
+    is_buy = SIDE_IS_BUY[sig["side"]]
+    if sig["action"] == "close":
+        is_buy = not is_buy
+    book_side = "B" if is_buy else "A"
+    if any(o.get("coin") == sig["symbol"] and o.get("side") == book_side for o in open_orders):
+        return True
+    return any(
+        f.get("coin") == sig["symbol"] and f.get("side") == book_side and f.get("time", 0) >= sig["created_ms"]
+        for f in fills
+    )
 
-            rounded_price = int(round(btc_mid))
-            opposite_side = "short" if side == "long" else "long"
+async def reconcile_claimed_signals(db_path: str, conn: sqlite3.Connection):
+    """
+    Settle signals a previous process claimed but never marked, e.g. because
+    it crashed between placing an order and recording it. A signal whose
+    order reached the exchange is marked executed; any other is marked
+    failed rather than replayed, since it cannot be ruled out that it is
+    still in flight somewhere. Assumes a single executor process, which
+    runs this before its first claim.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    stale = cursor.execute('''
+        SELECT id, action, symbol, side, CAST(strftime('%s', created_at) AS INTEGER) * 1000 AS created_ms
+        FROM trade_signals
+        WHERE executed = ?
+        ORDER BY id
+    ''', (SIGNAL_CLAIMED,)).fetchall()
+    if not stale:
+        return
 
-            resp = place_limit_order_with_chase_openorders(
-                side=opposite_side,
-                size=close_size,
-                initial_price=rounded_price,
-                reduce_only=True
-            )
+    logging.warning("Found %s signal(s) left claimed by an earlier pass: %s", len(stale), [sig["id"] for sig in stale])
+    open_orders, fills = await asyncio.gather(
+        asyncio.to_thread(info.open_orders, ACCOUNT_ADDRESS),
+        asyncio.to_thread(info.user_fills, ACCOUNT_ADDRESS)
+    )
+    rows = []
+    for sig in stale:
+        if sig["action"] in ("open", "close") and order_reached_exchange(sig, open_orders, fills):
+            logging.info("Claimed signal %s has an order on the exchange.", sig["id"])
+            rows.append((SIGNAL_EXECUTED, sig["id"]))
+        else:
+            logging.warning("Claimed signal %s has no order on the exchange.", sig["id"])
+            rows.append((SIGNAL_FAILED, sig["id"]))
+    mark_signals(db_path, rows, conn)
+
+async def execute_pending_signals(db_path: str):
+    global _claims_reconciled, _signals_data_version
+    conn = get_connection(db_path)
+    if not _claims_reconciled:
+        await reconcile_claimed_signals(db_path, conn)
+        _claims_reconciled = True
+    # Pending rows only come from another connection's commit (decision_making
+    # inserting a signal), and data_version changes on exactly those. An idle
+    # pass stops here without reading a table or taking the write lock, and
+    # before the socket or meta are touched.
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if data_version == _signals_data_version:
+        logging.info("No unexecuted trade signals found.")
+        return
+    signals = claim_pending_signals(db_path, conn)
+    _signals_data_version = data_version
+    if not signals:
+        logging.info("No unexecuted trade signals found.")
+        return
 
-            if resp.get("status") == "err":
-                mark_signal_failed(db_path, signal_id)
-            else:
-                statuses = resp["response"]["data"].get("statuses", [])
-                if any("error" in s for s in statuses):
-                    mark_signal_failed(db_path, signal_id)
-                else:
-                    mark_signal_executed(db_path, signal_id)
+    # Symbols are independent, so each one's signals run as their own task;
+    # within a symbol they keep id order, since a close must follow its open.
+    by_symbol = {}
+    for sig in signals:
+        by_symbol.setdefault(sig["symbol"], []).append(sig)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SYMBOLS)
+    margin_lock = asyncio.Lock()
+    started = set()
+
+    async def run(symbol_signals: list):
+        async with semaphore:
+            await execute_symbol_signals(db_path, conn, symbol_signals, started, margin_lock)
+
+    # Everything after the claim runs inside the try, so a failure here
+    # still releases the claimed signals.
+    try:
+        ORDER_EVENTS.start()
+        # Fetched here so the per-signal get_size_decimals() calls below are
+        # answered from the cached universe.
+        await asyncio.to_thread(get_universe)
+
+        # Every symbol runs to completion even if another one fails, so no
+        # task is still handling a signal when the unstarted ones are released.
+        results = await asyncio.gather(
+            *(run(symbol_signals) for symbol_signals in by_symbol.values()),
+            return_exceptions=True
+        )
+    finally:
+        # Claimed signals the pass never got to go back to pending. This
+        # connection's own commit leaves data_version alone, so the next pass
+        # is told to claim them.
+        released = [(SIGNAL_PENDING, sig["id"]) for sig in signals if sig["id"] not in started]
+        if released:
+            _signals_data_version = None
+        mark_signals(db_path, released, conn)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 from hyperliquid.info import Info
 from hyperliquid.utils import constants
 import eth_account
+import random
 import time
 
 # Load environment variables
@@ -58,13 +59,14 @@ def fetch_usdc_balance(info):
         return 0
 
 # Step 4: Retry logic wrapper
-def retry(func, retries=3, delay=2):
+def retry(func, retries=3, delay=0.5, max_delay=4):
+    # Exponential backoff with jitter, so repeated runs don't retry in lockstep.
     for i in range(retries):
         try:
             return func()
         except Exception as e:
             print(f"Attempt {i + 1} failed: {e}")
-            time.sleep(delay)
+            time.sleep(min(max_delay, delay * 2 ** i) + random.uniform(0, delay))
     raise Exception("All retry attempts failed.")
 
 # Step 5: Main workflow
@@ -0,0 +1,24 @@
+import os
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../scripts'))
+
+from pricing import round_price, round_to_lot
+
+def test_round_price_keeps_whole_dollars_for_six_digit_btc():
+    assert round_price(112345.6, 5) == 112346
+    assert round_price(112345.4, 5) == 112345
+
+def test_round_price_leaves_whole_numbers_unchanged():
+    assert round_price(112345.0, 5) == 112345
+    assert round_price(63000.0, 5) == 63000
+
+def test_round_price_limits_fractional_prices():
+    assert round_price(63123.456, 5) == 63123
+    assert round_price(3123.456, 4) == 3123.5
+    assert round_price(1.23456, 2) == 1.2346
+    assert round_price(0.123456, 0) == 0.12346
+
+def test_round_to_lot_rounds_down():
+    assert round_to_lot(Decimal("0.0392999"), 5) == Decimal("0.03929")